@@ -1,8 +1,21 @@
+import functools
+import html
+import os
 import streamlit as st
 import pandas as pd
 import yfinance as yf
 import plotly.express as px
-from datetime import datetime, timedelta
+import plotly.io as pio
+from datetime import datetime
+from urllib.parse import urlparse
+
+import alerts
+import export
+import news_pipeline
+import price_store
+import upstream
+import view_models
+from storage import cache_path
 
 
 COLORS = {
@@ -590,35 +603,78 @@ def get_indian_stocks():
 
     }
 
-def to_crores(x):
-    """Convert numbers to Crores (Indian numbering system)"""
-    return x / 10000000
+@st.cache_data(ttl=300)
+def load_news(ticker):
+    """Read the precomputed sentiment series and articles for a ticker"""
+    return news_pipeline.load_sentiment_series(ticker), news_pipeline.load_articles(ticker)
+
+@st.cache_data(max_entries=256, show_spinner=False)
+def load_view_model(ticker, name, data_version, _stock_data):
+    """Per-ticker view model, materialized once per data version and shared by all sessions"""
+    return view_models.build_view_model(ticker, _stock_data, COLORS, name)
+
+def style_statement(frame):
+    """Crore formatting with gains in green and losses in red"""
+    return (
+        frame.style.format("{:,.2f} Cr")
+        .applymap(lambda x: f"color: {COLORS['accent_success']}" if isinstance(x, (int, float)) and x > 0 
+                  else f"color: {COLORS['accent_danger']}" if isinstance(x, (int, float)) and x < 0 
+                  else "")
+    )
+
+def show_figure(figure_json):
+    """Render a figure stored as Plotly JSON"""
+    st.plotly_chart(pio.from_json(figure_json), use_container_width=True)
+
+@st.cache_resource
+def get_alert_engine():
+    """Alert engine shared by every session, loaded from the saved rules
+
+    A background thread keeps evaluating every ticker that has rules, not
+    just the ones sessions are looking at.
+    """
+    engine = alerts.AlertEngine(alerts.load_rules())
+    alerts.start_refresher(engine)
+    return engine
+
+STATEMENTS = [
+    'financials', 'balance_sheet', 'cashflow',
+    'quarterly_financials', 'quarterly_balance_sheet', 'quarterly_cashflow'
+]
+
+@st.cache_data(ttl=price_store.REFRESH_INTERVAL, show_spinner=False)
+def fetch_fundamentals(ticker):
+    """Company info and statements, fetched at most once per refresh interval across sessions"""
+    client = upstream.get_client()
+    stock = yf.Ticker(ticker)
+    stock_data = {'info': client.call(upstream.YAHOO_HOST, lambda: stock.info) or {}}
+    for name in STATEMENTS:
+        stock_data[name] = client.call(upstream.YAHOO_HOST, getattr, stock, name)
+    upstream.save_last_good(ticker, stock_data)
+    return stock_data
 
 def fetch_stock_data(ticker):
-    """Fetch comprehensive stock data from Yahoo Finance"""
+    """Fetch comprehensive stock data from Yahoo Finance, falling back to the last good copy"""
+    client = upstream.get_client()
     try:
-        stock = yf.Ticker(ticker)
-        info = stock.info or {}
-        hist = stock.history(period="max")
+        stock_data = fetch_fundamentals(ticker)
+        # Incremental: only new bars are downloaded, with splits and dividends back-applied
+        history = functools.partial(client.call, upstream.YAHOO_HOST, yf.Ticker(ticker).history)
+        hist = price_store.update_history(ticker, history)
         
         if hist.empty:
             raise ValueError("No historical data available")
             
-        # Remove timezone if present
-        if hist.index.tz is not None:
-            hist.index = hist.index.tz_localize(None)
-            
-        return {
-            'info': info,
-            'hist': hist,
-            'financials': stock.financials,
-            'balance_sheet': stock.balance_sheet,
-            'cashflow': stock.cashflow,
-            'quarterly_financials': stock.quarterly_financials,
-            'quarterly_balance_sheet': stock.quarterly_balance_sheet,
-            'quarterly_cashflow': stock.quarterly_cashflow
-        }
+        return {**stock_data, 'hist': hist}
     except Exception as e:
+        saved, saved_at = upstream.load_last_good(ticker)
+        hist = price_store.load_history(ticker)
+        if saved is not None and not hist.empty:
+            st.warning(
+                f"Yahoo Finance is unavailable ({str(e)}). "
+                f"Showing data saved on {datetime.fromtimestamp(saved_at):%d %b %Y %H:%M}."
+            )
+            return {**saved, 'hist': hist}
         st.error(f"Failed to fetch data for {ticker}: {str(e)}")
         return None
 
@@ -646,6 +702,40 @@ with st.sidebar:
             ticker = selected.split(" - ")[0]
         else:
             st.warning("No matching stocks found. Try: RELIANCE.NS, TATASTEEL.NS")
+    
+    # Alert rules for the selected stock
+    alert_engine = get_alert_engine()
+    alert_user = "default"
+    if ticker:
+        with st.expander("🔔 Alerts"):
+            alert_user = st.text_input("Your name", value="default", key="alert_user")
+            alert_kind = st.selectbox(
+                "Alert type", list(alerts.RULE_KINDS), format_func=alerts.RULE_KINDS.get, key="alert_kind"
+            )
+            if alert_kind == "ma_cross":
+                alert_direction = st.selectbox("Direction", ["any", "golden", "death"], key="alert_direction")
+                alert_value = 0.0
+            else:
+                alert_direction = "any"
+                alert_value = st.number_input("Value", min_value=0.0, value=5.0, key="alert_value")
+            
+            if st.button("Add alert"):
+                alert_engine.add_rule(alerts.Rule(alert_user, ticker, alert_kind, alert_value, alert_direction))
+                alerts.save_rules(alert_engine)
+            
+            for rule in alert_engine.user_rules(alert_user):
+                col1, col2 = st.columns([4, 1])
+                col1.caption(rule.describe())
+                if col2.button("✕", key=f"remove_{rule.rule_id}"):
+                    alert_engine.remove_rule(rule.rule_id)
+                    alerts.save_rules(alert_engine)
+                    st.rerun()
+            
+            recent = alert_engine.user_alerts(alert_user)[:5]
+            if recent:
+                st.markdown("**Recent alerts**")
+                for alert in recent:
+                    st.caption(f"{alert.date:%d %b %Y} · {alert.message}")
 
 #  MAIN DASHBOARD 
 st.markdown(f"""
@@ -686,6 +776,23 @@ if stock_data is None:
 info = stock_data['info']
 hist = stock_data['hist']
 
+# Evaluate alert rules against any bars that arrived with this fetch; other
+# tickers are evaluated by the engine's background refresh
+fresh = alert_engine.process(ticker, hist)
+seen = st.session_state.setdefault('alerts_seen', {})
+triggered = alert_engine.user_alerts(alert_user)
+if alert_user not in seen:
+    # Alerts raised before this session are listed in the sidebar instead
+    seen[alert_user] = {(alert.rule.rule_id, alert.date) for alert in triggered if alert not in fresh}
+for alert in triggered:
+    if (alert.rule.rule_id, alert.date) not in seen[alert_user]:
+        st.toast(f"🔔 {alert.message}")
+        seen[alert_user].add((alert.rule.rule_id, alert.date))
+
+# Everything below that only depends on the data is precomputed per data version
+view_model = load_view_model(ticker, STOCK_DB.get(ticker, ticker), view_models.fingerprint(stock_data), stock_data)
+live = view_models.live_view(info, STOCK_DB.get(ticker, ticker))
+
 # TECHNICAL ANALYSIS SECTION 
 st.markdown(f"""
 <h2 style='color: {COLORS["text_primary"]};'>
@@ -694,137 +801,160 @@ st.markdown(f"""
 """, unsafe_allow_html=True)
 
 # Date range 
+default_start, default_end = view_model['range']
 col1, col2 = st.columns(2)
 with col1:
-    start_date = st.date_input("From", value=datetime.now() - timedelta(days=365))
+    start_date = st.date_input("From", value=default_start)
 with col2:
-    end_date = st.date_input("To", value=datetime.now())
+    end_date = st.date_input("To", value=default_end)
 
 # Current price display
-current_price = info.get('currentPrice') or info.get('regularMarketPrice')
-st.metric(
-    "Current Price", 
-    f"₹{current_price:,.2f}" if current_price else "N/A",
-    delta=f"{info.get('regularMarketChangePercent', 0):.2f}%" if 'regularMarketChangePercent' in info else None
-)
+price, change = live['price']
+st.metric("Current Price", price, delta=change)
 
-# Filter historical data by date range
-start_dt = datetime.combine(start_date, datetime.min.time())
-end_dt = datetime.combine(end_date, datetime.min.time())
-range_hist = hist[(hist.index >= start_dt) & (hist.index <= end_dt)]
+# The default range is materialized; other ranges are built on demand
+if (start_date, end_date) == view_model['range']:
+    technical = view_model['technical']
+else:
+    technical = view_models.technical_view(hist, start_date, end_date, view_model['chart_title'], COLORS)
 
-if not range_hist.empty:
-    # Calculate moving averages
-    range_hist['50MA'] = range_hist['Close'].rolling(50).mean()
-    range_hist['200MA'] = range_hist['Close'].rolling(200).mean()
-    
-    # Create interactive price chart
-    fig = px.line(
-        range_hist, 
-        x=range_hist.index, 
-        y=['Close', '50MA', '200MA'],
-        title=f"{info.get('shortName', ticker)} Price Movement",
-        labels={'value': 'Price (₹)', 'variable': 'Metric'},
-        color_discrete_map={
-            'Close': COLORS['chart_line'],
-            '50MA': COLORS['chart_ma50'],
-            '200MA': COLORS['chart_ma200']
-        }
-    )
-    st.plotly_chart(fig, use_container_width=True)
+if technical['figure']:
+    show_figure(technical['figure'])
     
     # Technical indicators summary
     st.subheader("Key Technical Indicators")
-    col1, col2, col3 = st.columns(3)
-    with col1:
-        st.metric("50-Day MA", f"₹{range_hist['50MA'].iloc[-1]:,.2f}" if not pd.isna(range_hist['50MA'].iloc[-1]) else "N/A")
-    with col2:
-        st.metric("200-Day MA", f"₹{range_hist['200MA'].iloc[-1]:,.2f}" if not pd.isna(range_hist['200MA'].iloc[-1]) else "N/A")
-    with col3:
-        if not pd.isna(range_hist['50MA'].iloc[-1]) and not pd.isna(range_hist['200MA'].iloc[-1]):
-            crossover = "Bullish" if range_hist['50MA'].iloc[-1] > range_hist['200MA'].iloc[-1] else "Bearish"
-            st.metric("MA Crossover", crossover)
+    for col, (label, value) in zip(st.columns(3), technical['metrics']):
+        with col:
+            st.metric(label, value)
 
 # ANALYSIS TABS 
-tab1, tab2, tab3 = st.tabs(["📈 Overview", "💹 Financials", "📊 Valuation"])
+tab1, tab2, tab3, tab4, tab5 = st.tabs(["📈 Overview", "💹 Financials", "📊 Valuation", "📰 News", "⬇️ Export"])
 
 with tab1:  # Company Overview
+    overview = live['overview']
     st.markdown(f"""
     <h2 style='color: {COLORS["text_primary"]};'>
-        {info.get('longName', STOCK_DB.get(ticker, ticker))} ({ticker})
+        {overview['title']} ({ticker})
     </h2>
     """, unsafe_allow_html=True)
     
     # Key metrics in columns
-    col1, col2, col3 = st.columns(3)
-    with col1:
-        st.metric("Market Cap", f"₹{info.get('marketCap', 0)/1e7:,.0f} Cr" if info.get('marketCap') else "N/A")
-        st.metric("Sector", info.get('sector', 'N/A'))
-    with col2:
-        st.metric("52W High", f"₹{info.get('fiftyTwoWeekHigh', 'N/A'):,.2f}")
-        st.metric("52W Low", f"₹{info.get('fiftyTwoWeekLow', 'N/A'):,.2f}")
-    with col3:
-        st.metric("Volume", f"{info.get('volume', 'N/A'):,}" if isinstance(info.get('volume'), int) else "N/A")
-        st.metric("Avg. Volume", f"{info.get('averageVolume', 'N/A'):,}" if isinstance(info.get('averageVolume'), int) else "N/A")
+    for col, metrics in zip(st.columns(3), overview['columns']):
+        with col:
+            for label, value in metrics:
+                st.metric(label, value)
     
     # Business summary
     st.subheader("Business Summary")
-    st.write(info.get('longBusinessSummary', 'No business description available.'))
+    st.write(overview['summary'])
 
 with tab2:  # Financials
     st.header("Financial Analysis (₹ Crores)")
     
     period = st.radio("Period:", ["Annual", "Quarterly"], horizontal=True)
-    financials = stock_data['quarterly_financials'] if period == "Quarterly" else stock_data['financials']
-    cashflow = stock_data['quarterly_cashflow'] if period == "Quarterly" else stock_data['cashflow']
+    statements = view_model['statements'][period]
     
-    if not financials.empty:
+    if statements['financials']:
         st.subheader("Income Statement")
-        financials_cr = financials.apply(to_crores)
-        st.dataframe(
-            financials_cr.style.format("{:,.2f} Cr")
-            .applymap(lambda x: f"color: {COLORS['accent_success']}" if isinstance(x, (int, float)) and x > 0 
-                      else f"color: {COLORS['accent_danger']}" if isinstance(x, (int, float)) and x < 0 
-                      else "")
-        )
+        st.dataframe(style_statement(view_models.decode_table(statements['financials'])))
     
-    if not cashflow.empty:
+    if statements['cashflow']:
         st.subheader("Cash Flow Statement")
-        cashflow_cr = cashflow.apply(to_crores)
-        st.dataframe(
-            cashflow_cr.style.format("{:,.2f} Cr")
-            .applymap(lambda x: f"color: {COLORS['accent_success']}" if isinstance(x, (int, float)) and x > 0 
-                      else f"color: {COLORS['accent_danger']}" if isinstance(x, (int, float)) and x < 0 
-                      else "")
-        )
+        st.dataframe(style_statement(view_models.decode_table(statements['cashflow'])))
 
 with tab3:  # Valuation
     st.header("Valuation Metrics")
     
+    ratio_period = st.radio("Period:", ["Annual", "Quarterly"], horizontal=True, key="ratio_period")
+    ratio_view = view_model['ratios'][ratio_period]
+    valuation, profitability = view_models.ratio_tables(ratio_view, info)
+    
     # Valuation Ratios
-    valuation_data = {
-        "Metric": ["P/E", "P/B", "P/S", "EV/EBITDA", "Dividend Yield"],
-        "Value": [
-            info.get('trailingPE', 'N/A'),
-            info.get('priceToBook', 'N/A'),
-            info.get('priceToSalesTrailing12Months', 'N/A'),
-            info.get('enterpriseToEbitda', 'N/A'),
-            f"{info.get('dividendYield', 0)*100:.2f}%" if info.get('dividendYield') else "N/A"
-        ]
-    }
-    st.dataframe(pd.DataFrame(valuation_data), hide_index=True)
+    st.dataframe(valuation, hide_index=True)
     
     # Profitability Ratios
-    profitability_data = {
-        "Metric": ["ROE", "ROA", "Operating Margin", "Gross Margin"],
-        "Value": [
-            f"{info.get('returnOnEquity', 0)*100:.2f}%" if info.get('returnOnEquity') else "N/A",
-            f"{info.get('returnOnAssets', 0)*100:.2f}%" if info.get('returnOnAssets') else "N/A",
-            f"{info.get('operatingMargins', 0)*100:.2f}%" if info.get('operatingMargins') else "N/A",
-            f"{info.get('grossMargins', 0)*100:.2f}%" if info.get('grossMargins') else "N/A"
-        ]
-    }
-    st.dataframe(pd.DataFrame(profitability_data), hide_index=True)
+    st.dataframe(profitability, hide_index=True)
+    
+    # Ratio trends
+    if ratio_view['multiples_figure'] is None:
+        st.info("Not enough statement history to chart ratio trends.")
+    else:
+        st.subheader("Ratio Trends")
+        col1, col2 = st.columns(2)
+        with col1:
+            show_figure(ratio_view['multiples_figure'])
+        with col2:
+            show_figure(ratio_view['margins_figure'])
+
+with tab4:  # News
+    st.header("News Sentiment")
+    
+    sentiment, articles = load_news(ticker)
+    if sentiment.empty:
+        st.info(f"No news ingested for {ticker} yet. Run `python news_pipeline.py {ticker}` to fetch it.")
+    else:
+        fig = px.bar(
+            sentiment,
+            x=sentiment.index,
+            y='sentiment',
+            hover_data=['articles'],
+            title="Daily Average Sentiment",
+            labels={'date': 'Date', 'sentiment': 'Sentiment (-1 to 1)'},
+            color='sentiment',
+            color_continuous_scale=[COLORS['accent_danger'], COLORS['text_secondary'], COLORS['accent_success']],
+            range_color=[-1, 1]
+        )
+        st.plotly_chart(fig, use_container_width=True)
+        
+        st.subheader("Latest Headlines")
+        for _, article in articles.head(20).iterrows():
+            color = COLORS['accent_success'] if article['sentiment'] > 0 else COLORS['accent_danger'] if article['sentiment'] < 0 else COLORS['text_secondary']
+            published = article['published'].strftime('%d %b %Y') if not pd.isna(article['published']) else ""
+            title = html.escape(str(article['title']))
+            link = str(article['link']) if not pd.isna(article['link']) else ""
+            if urlparse(link).scheme in ("http", "https"):
+                title = f'<a href="{html.escape(link)}" style="color: {COLORS["text_primary"]};">{title}</a>'
+            st.markdown(f"""
+            <div style="color: {COLORS['text_primary']}; margin-bottom: 0.5rem;">
+                {title}
+                <br>
+                <span style="color: {COLORS['text_secondary']}; font-size: 0.85em;">{published}</span>
+                <span style="color: {color}; font-size: 0.85em;"> · sentiment {article['sentiment']:+.2f}</span>
+            </div>
+            """, unsafe_allow_html=True)
+
+with tab5:  # Export
+    st.header("Export Data")
+    
+    watchlist = st.multiselect(
+        "Tickers", list(STOCK_DB), default=[ticker],
+        format_func=lambda symbol: f"{symbol} - {STOCK_DB[symbol]}"
+    )
+    export_format = st.selectbox("Format", export.available_formats())
+    st.caption("Bundles contain daily bars with 50/200-day moving averages and all financial statements.")
+    
+    if st.button("Prepare export", disabled=not watchlist):
+        export_path = cache_path("exports", f"equityx_{datetime.now():%Y%m%d_%H%M%S_%f}.zip")
+        export.remove_old_bundles(os.path.dirname(export_path))
+        progress = st.progress(0.0, text="Exporting...")
+        skipped = export.write_bundle(
+            export_path,
+            watchlist,
+            lambda symbol: export.cached_stock_data(symbol) or fetch_stock_data(symbol),
+            export_format,
+            progress=lambda done, total: progress.progress(done / total, text=f"Exported {done} of {total} tickers")
+        )
+        if skipped:
+            st.warning(f"No data available for: {', '.join(skipped)}")
+        
+        # Only offered right after preparing, so later reruns don't keep the bundle in memory
+        with open(export_path, "rb") as f:
+            st.download_button(
+                "⬇️ Download bundle", f,
+                file_name=os.path.basename(export_path),
+                mime="application/zip"
+            )
+        os.remove(export_path)
 
 # FOOTER 
 st.divider()
@@ -0,0 +1,364 @@
+"""Rule-based price alerts evaluated incrementally as new bars arrive
+
+Rules are indexed by ticker and, within a ticker, kept sorted by threshold, so
+a new bar only touches the rules of its own ticker and, for level based rules,
+only the rules whose threshold it actually crossed. Each ticker keeps a small
+rolling state (last 200 closes, last 20 volumes and running sums), so moving
+averages and volume baselines are updated in O(1) per bar instead of rescanning
+the history.
+
+The dashboard keeps one engine per server and refreshes every ticker that has
+rules on a background thread (``start_refresher``), so alerts fire without
+anyone opening the ticker. Run ``python alerts.py`` to do a single refresh
+from the command line and print the alerts raised by the new bars.
+"""
+import bisect
+import functools
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from dataclasses import asdict, dataclass, field
+
+import pandas as pd
+
+from storage import cache_path, temp_path
+
+RULE_KINDS = {
+    "price_above": "Price crosses above",
+    "price_below": "Price crosses below",
+    "ma_cross": "50/200 MA cross",
+    "pct_move": "Daily move of at least (%)",
+    "volume_spike": "Volume vs 20-day average (x)",
+}
+MA_FAST, MA_SLOW, VOLUME_WINDOW = 50, 200, 20
+
+
+@dataclass
+class Rule:
+    user: str
+    ticker: str
+    kind: str
+    value: float = 0.0           # price level, percent move or volume multiple
+    direction: str = "any"       # ma_cross only: "golden", "death" or "any"
+    rule_id: str = field(default_factory=lambda: uuid.uuid4().hex[:12])
+
+    def describe(self):
+        if self.kind == "ma_cross":
+            return f"{self.ticker}: 50/200 MA cross ({self.direction})"
+        return f"{self.ticker}: {RULE_KINDS[self.kind]} {self.value:,.2f}"
+
+
+@dataclass
+class Alert:
+    rule: Rule
+    date: pd.Timestamp
+    message: str
+
+
+class TickerState:
+    """Rolling per-ticker values needed to evaluate rules on the next bar"""
+
+    def __init__(self):
+        self.closes = deque(maxlen=MA_SLOW)
+        self.volumes = deque(maxlen=VOLUME_WINDOW)
+        self.sum_fast = self.sum_slow = self.sum_volume = 0.0
+        self.last_date = None
+        self.ma_sign = 0
+        self.last_alerts = set()     # rule ids raised by the last bar
+        self.undo = None
+
+    def moving_averages(self):
+        n = len(self.closes)
+        fast = self.sum_fast / MA_FAST if n >= MA_FAST else None
+        slow = self.sum_slow / MA_SLOW if n >= MA_SLOW else None
+        return fast, slow
+
+    def average_volume(self):
+        return self.sum_volume / len(self.volumes) if self.volumes else None
+
+    def push(self, date, close, volume):
+        """Add a bar in O(1)"""
+        self.undo = (
+            self.last_date, self.ma_sign,
+            self.closes[0] if len(self.closes) == MA_SLOW else None,
+            self.volumes[0] if len(self.volumes) == VOLUME_WINDOW else None,
+        )
+        if len(self.closes) >= MA_FAST:
+            self.sum_fast -= self.closes[-MA_FAST]
+        if len(self.closes) == MA_SLOW:
+            self.sum_slow -= self.closes[0]
+        if len(self.volumes) == VOLUME_WINDOW:
+            self.sum_volume -= self.volumes[0]
+        self.closes.append(close)
+        self.volumes.append(volume)
+        self.sum_fast += close
+        self.sum_slow += close
+        self.sum_volume += volume
+        self.last_date = date
+
+        fast, slow = self.moving_averages()
+        if fast is not None and slow is not None and fast != slow:
+            self.ma_sign = 1 if fast > slow else -1
+
+    def pop(self):
+        """Undo the last push in O(1), so a revised bar can be pushed again"""
+        self.last_date, self.ma_sign, dropped_close, dropped_volume = self.undo
+        self.undo = None
+        close, volume = self.closes.pop(), self.volumes.pop()
+        self.sum_fast -= close
+        self.sum_slow -= close
+        self.sum_volume -= volume
+        if dropped_close is not None:
+            self.closes.appendleft(dropped_close)
+            self.sum_slow += dropped_close
+        if dropped_volume is not None:
+            self.volumes.appendleft(dropped_volume)
+            self.sum_volume += dropped_volume
+        if len(self.closes) >= MA_FAST:
+            self.sum_fast += self.closes[-MA_FAST]
+
+
+class TickerRules:
+    """One ticker's rules, with level based rules sorted by threshold"""
+
+    def __init__(self):
+        self.sorted = {kind: [] for kind in ("price_above", "price_below", "pct_move", "volume_spike")}
+        self.ma_cross = []
+
+    def add(self, rule):
+        if rule.kind == "ma_cross":
+            self.ma_cross.append(rule)
+        else:
+            bisect.insort(self.sorted[rule.kind], (rule.value, rule.rule_id, rule))
+
+    def remove(self, rule):
+        if rule.kind == "ma_cross":
+            self.ma_cross.remove(rule)
+        else:
+            self.sorted[rule.kind].remove((rule.value, rule.rule_id, rule))
+
+    def __len__(self):
+        return len(self.ma_cross) + sum(len(rules) for rules in self.sorted.values())
+
+    def _between(self, kind, low, high):
+        """Rules of ``kind`` with low < threshold <= high"""
+        rules = self.sorted[kind]
+        start = bisect.bisect_right(rules, (low, chr(0x10FFFF)))
+        end = bisect.bisect_right(rules, (high, chr(0x10FFFF)))
+        return [rule for _, _, rule in rules[start:end]]
+
+    def evaluate(self, state, date, close, volume):
+        """Rules triggered by a bar, given the state before the bar"""
+        alerts = []
+        prev = state.closes[-1] if state.closes else None
+        avg_volume = state.average_volume()
+        prev_sign = state.ma_sign
+        state.push(date, close, volume)
+
+        if prev is not None:
+            for rule in self._between("price_above", prev, close) if close > prev else []:
+                alerts.append(Alert(rule, date, f"{rule.ticker} crossed above ₹{rule.value:,.2f} at ₹{close:,.2f}"))
+            for rule in self._between("price_below", close - 1e-12, prev - 1e-12) if close < prev else []:
+                alerts.append(Alert(rule, date, f"{rule.ticker} crossed below ₹{rule.value:,.2f} at ₹{close:,.2f}"))
+            move = (close / prev - 1) * 100 if prev else 0.0
+            for rule in self._between("pct_move", float("-inf"), abs(move)):
+                alerts.append(Alert(rule, date, f"{rule.ticker} moved {move:+.2f}% to ₹{close:,.2f}"))
+
+        if avg_volume:
+            multiple = volume / avg_volume
+            for rule in self._between("volume_spike", float("-inf"), multiple):
+                alerts.append(Alert(rule, date, f"{rule.ticker} volume {multiple:.1f}x its 20-day average"))
+
+        if prev_sign and state.ma_sign and state.ma_sign != prev_sign:
+            cross = "golden" if state.ma_sign > 0 else "death"
+            for rule in self.ma_cross:
+                if rule.direction in ("any", cross):
+                    alerts.append(Alert(rule, date, f"{rule.ticker} 50/200 MA {cross} cross"))
+        return alerts
+
+
+class AlertEngine:
+    """Holds every user's rules and evaluates them against incoming bars"""
+
+    def __init__(self, rules=()):
+        self.rules = {}
+        self.by_ticker = defaultdict(TickerRules)
+        self.states = {}
+        self.triggered = defaultdict(lambda: deque(maxlen=50))
+        self.lock = threading.Lock()
+        for rule in rules:
+            self.add_rule(rule)
+
+    def add_rule(self, rule):
+        if rule.kind not in RULE_KINDS:
+            raise ValueError(f"Unknown alert kind: {rule.kind}")
+        with self.lock:
+            self.rules[rule.rule_id] = rule
+            self.by_ticker[rule.ticker].add(rule)
+        return rule
+
+    def remove_rule(self, rule_id):
+        with self.lock:
+            rule = self.rules.pop(rule_id)
+            self.by_ticker[rule.ticker].remove(rule)
+            if not self.by_ticker[rule.ticker]:
+                del self.by_ticker[rule.ticker]
+                self.states.pop(rule.ticker, None)
+
+    def user_rules(self, user, ticker=None):
+        with self.lock:
+            rules = list(self.rules.values())
+        return [r for r in rules if r.user == user and (ticker is None or r.ticker == ticker)]
+
+    def user_alerts(self, user):
+        """Alerts triggered for ``user``, newest first"""
+        with self.lock:
+            return list(self.triggered.get(user, ()))
+
+    def tickers(self):
+        with self.lock:
+            return sorted(self.by_ticker)
+
+    def warm_up(self, ticker, bars):
+        """Rebuild a ticker's rolling state from the tail of its history
+
+        Bars without a close or volume are skipped, as one NaN would poison
+        the running sums for good.
+        """
+        state = TickerState()
+        tail = bars.dropna(subset=["Close", "Volume"]).tail(MA_SLOW)
+        for date, close, volume in zip(tail.index, tail["Close"], tail["Volume"]):
+            state.push(date, float(close), float(volume))
+        self.states[ticker] = state
+
+    def process(self, ticker, hist):
+        """Evaluate the bars of ``hist`` not seen yet for ``ticker``
+
+        The first call for a ticker only seeds its state, so past bars never
+        raise alerts. The last seen bar may have been today's partial session,
+        so when its close or volume changed it is taken back out of the state
+        and evaluated again, without repeating alerts it already raised. A
+        split or dividend among the new bars re-adjusts the stored history, so
+        the state is then rebuilt from the adjusted tail.
+        """
+        with self.lock:
+            rules = self.by_ticker.get(ticker)
+            hist = hist.dropna(subset=["Close", "Volume"])
+            if not rules or hist.empty:
+                return []
+            state = self.states.get(ticker)
+            if state is None:
+                self.warm_up(ticker, hist)
+                return []
+
+            last_date, revised = state.last_date, False
+            new = hist[hist.index >= last_date]
+            if not new.empty and new.index[0] == last_date:
+                bar = (float(new["Close"].iloc[0]), float(new["Volume"].iloc[0]))
+                revised = bar != (state.closes[-1], state.volumes[-1])
+                if not revised:
+                    new = new.iloc[1:]
+            if new.empty:
+                return []
+            raised = state.last_alerts if revised else set()
+
+            actions = [c for c in ("Dividends", "Stock Splits") if c in new]
+            if actions and (new[actions].fillna(0) != 0).any().any():
+                self.warm_up(ticker, hist[hist.index < new.index[0]])
+                state = self.states[ticker]
+            elif revised:
+                state.pop()
+
+            alerts = []
+            for date, close, volume in zip(new.index, new["Close"], new["Volume"]):
+                alerts.extend(
+                    alert for alert in rules.evaluate(state, date, float(close), float(volume))
+                    if date != last_date or alert.rule.rule_id not in raised
+                )
+            state.last_alerts = {alert.rule.rule_id for alert in alerts if alert.date == state.last_date}
+            if state.last_date == last_date:
+                state.last_alerts |= raised
+            for alert in alerts:
+                self.triggered[alert.rule.user].appendleft(alert)
+            return alerts
+
+
+def _rules_path():
+    return cache_path("alerts", "rules.json")
+
+
+def load_rules():
+    """Rules saved on disk"""
+    path = _rules_path()
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return [Rule(**rule) for rule in json.load(f)]
+
+
+def save_rules(engine):
+    """Persist every rule of the engine"""
+    path = _rules_path()
+    with engine.lock:
+        rules = [asdict(rule) for rule in engine.rules.values()]
+    tmp = temp_path(path)
+    with open(tmp, "w") as f:
+        json.dump(rules, f, indent=1)
+    os.replace(tmp, path)
+
+
+def refresh_universe(engine):
+    """Update the stored history of every ticker with rules and evaluate its new bars"""
+    import yfinance as yf
+
+    import price_store
+    import upstream
+
+    client = upstream.get_client()
+    alerts = []
+    for ticker in engine.tickers():
+        stored = price_store.load_history(ticker)
+        with engine.lock:
+            if not stored.empty and ticker not in engine.states:
+                engine.warm_up(ticker, stored)
+        try:
+            history = functools.partial(client.call, upstream.YAHOO_HOST, yf.Ticker(ticker).history)
+            hist = price_store.update_history(ticker, history)
+        except Exception as e:
+            print(f"{ticker}: skipped ({e})")
+            continue
+        alerts.extend(engine.process(ticker, hist))
+    return alerts
+
+
+def start_refresher(engine, interval=None):
+    """Run ``refresh_universe`` on a daemon thread every ``interval`` seconds
+
+    Defaults to the price store's refresh interval, since histories fresher
+    than that are not downloaded again anyway.
+    """
+    import price_store
+
+    interval = price_store.REFRESH_INTERVAL if interval is None else interval
+
+    def run():
+        while True:
+            try:
+                refresh_universe(engine)
+            except Exception as e:
+                print(f"alert refresh failed ({e})", file=sys.stderr)
+            time.sleep(interval)
+
+    thread = threading.Thread(target=run, name="alert-refresh", daemon=True)
+    thread.start()
+    return thread
+
+
+if __name__ == "__main__":
+    engine = AlertEngine(load_rules())
+    for alert in refresh_universe(engine):
+        print(f"[{alert.rule.user}] {alert.date:%d %b %Y} {alert.message}")
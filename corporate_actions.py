@@ -0,0 +1,81 @@
+"""Back-adjustment of stored price history for splits and dividends
+
+Yahoo's history is adjusted for every split and dividend relative to the most
+recent bar. When only new bars are appended to a stored history, any split or
+dividend among them has to be applied to the stored rows as well, or the
+series gets a step at the ex-date. These helpers detect the actions from the
+``Dividends`` and ``Stock Splits`` columns and apply them to the stored rows
+in one vectorized pass.
+"""
+import numpy as np
+import pandas as pd
+
+PRICE_COLUMNS = ["Open", "High", "Low", "Close"]
+
+
+def new_action_factors(combined, is_new):
+    """Total price and volume factors for the actions on ``is_new`` rows
+
+    A dividend D scales earlier prices by ``1 - D / prior close`` and a split
+    of ratio R scales them by ``1 / R`` (and volumes by ``R``). The prior
+    close comes from the fresh download, which already carries the provider's
+    adjustment for its own and later actions; its dividends are split adjusted
+    just like its closes, so only the later dividend factors are undone to
+    recover the prior close. Actions are walked newest first, and there are
+    only ever a handful of them.
+    """
+    dividends = combined["Dividends"].fillna(0) if "Dividends" in combined else pd.Series(0.0, index=combined.index)
+    splits = combined["Stock Splits"].fillna(0) if "Stock Splits" in combined else pd.Series(0.0, index=combined.index)
+    closes = combined["Close"].to_numpy()
+
+    split_factor, dividend_factor = 1.0, 1.0
+    actions = np.flatnonzero(is_new & ((dividends > 0) | (splits > 0)).to_numpy())
+    for pos in actions[::-1]:
+        dividend = dividends.iloc[pos]
+        if dividend > 0 and pos > 0:
+            prior = closes[pos - 1] / dividend_factor + dividend
+            dividend_factor *= 1 - dividend / prior
+        if splits.iloc[pos] > 0:
+            split_factor /= splits.iloc[pos]
+    return split_factor * dividend_factor, 1.0 / split_factor
+
+
+def new_actions(stored, bars):
+    """Split and dividend rows in ``bars`` dated after the stored history"""
+    after = bars.index > stored.index[-1] if not stored.empty else slice(None)
+    new = bars.loc[after]
+    mask = pd.Series(False, index=new.index)
+    for column in ("Dividends", "Stock Splits"):
+        if column in new:
+            mask |= new[column].fillna(0) > 0
+    return new[mask]
+
+
+def merge_adjusted(stored, bars):
+    """Append ``bars`` to ``stored``, back-adjusting stored rows for new actions
+
+    ``bars`` are assumed to be adjusted consistently among themselves (as a
+    fresh Yahoo download is). Bars overlapping the stored history replace it.
+    Returns the merged frame and the actions that were applied.
+    """
+    if stored.empty or bars.empty:
+        merged = bars.copy() if stored.empty else stored.copy()
+        return merged, new_actions(stored, bars)
+
+    combined = pd.concat([stored[stored.index < bars.index[0]], bars])
+    combined = combined[~combined.index.duplicated(keep="last")].sort_index()
+
+    # Only actions dated after the old history were not applied to it yet,
+    # and every one of them is later than all rows kept from it
+    is_new = combined.index > stored.index[-1]
+    is_old = combined.index < bars.index[0]
+    price_factor, volume_factor = new_action_factors(combined, is_new)
+    if price_factor == 1.0 and volume_factor == 1.0:
+        return combined, new_actions(stored, bars)
+
+    columns = [c for c in PRICE_COLUMNS if c in combined]
+    combined.loc[is_old, columns] = combined.loc[is_old, columns] * price_factor
+    if "Volume" in combined:
+        volume = combined["Volume"]
+        combined["Volume"] = volume.where(~is_old, (volume * volume_factor).round()).astype(volume.dtype)
+    return combined, new_actions(stored, bars)
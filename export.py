@@ -0,0 +1,185 @@
+"""Export of analysis bundles in Parquet, Arrow IPC or CSV
+
+A bundle holds the daily bars with moving averages and the financial
+statements of one ticker or a whole watchlist. Tickers are loaded one at a
+time and written in row chunks, so only one ticker's data is ever in memory.
+The two tables are then zipped into a single download. Parquet and Arrow IPC
+need pyarrow; CSV always works.
+"""
+import os
+import shutil
+import tempfile
+import time
+import zipfile
+
+import pandas as pd
+
+import price_store
+import upstream
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+FORMATS = {"Parquet": ".parquet", "Arrow IPC": ".arrow", "CSV": ".csv"}
+CHUNK_ROWS = 50_000
+BUNDLE_MAX_AGE = 60 * 60       # seconds before a leftover bundle is removed
+
+BAR_FIELDS = ["Open", "High", "Low", "Close", "Volume", "Dividends", "Stock Splits"]
+BAR_COLUMNS = ["Ticker", "Date"] + BAR_FIELDS + ["50MA", "200MA"]
+STATEMENT_COLUMNS = ["Ticker", "Statement", "Period", "Line Item", "Value"]
+STATEMENTS = [
+    'financials', 'balance_sheet', 'cashflow',
+    'quarterly_financials', 'quarterly_balance_sheet', 'quarterly_cashflow'
+]
+
+
+def available_formats():
+    """Export formats usable with the installed packages"""
+    return [fmt for fmt in FORMATS if pa is not None or fmt == "CSV"]
+
+
+def _schemas():
+    bars = pa.schema(
+        [("Ticker", pa.string()), ("Date", pa.timestamp("ns"))]
+        + [(c, pa.int64() if c == "Volume" else pa.float64()) for c in BAR_COLUMNS[2:]]
+    )
+    statements = pa.schema([
+        ("Ticker", pa.string()), ("Statement", pa.string()), ("Period", pa.timestamp("ns")),
+        ("Line Item", pa.string()), ("Value", pa.float64()),
+    ])
+    return bars, statements
+
+
+def cached_stock_data(ticker):
+    """Stored history and last saved statements, without any upstream call"""
+    hist = price_store.load_history(ticker)
+    if hist.empty:
+        return None
+    saved, _ = upstream.load_last_good(ticker)
+    return {**(saved or {}), 'hist': hist}
+
+
+def bars_frame(ticker, hist):
+    """Daily bars with 50/200-day moving averages in export layout"""
+    frame = hist.reindex(columns=BAR_FIELDS)
+    frame["Volume"] = frame["Volume"].fillna(0).astype("int64")
+    frame["50MA"] = frame["Close"].rolling(50).mean()
+    frame["200MA"] = frame["Close"].rolling(200).mean()
+    frame.insert(0, "Date", frame.index)
+    frame.insert(0, "Ticker", ticker)
+    return frame.reset_index(drop=True)
+
+
+def statements_frame(ticker, stock_data):
+    """All statements of a ticker as one long table"""
+    frames = []
+    for name in STATEMENTS:
+        statement = stock_data.get(name)
+        if statement is None or statement.empty:
+            continue
+        long = (
+            statement.apply(pd.to_numeric, errors="coerce")
+            .rename_axis("Line Item").reset_index()
+            .melt(id_vars="Line Item", var_name="Period", value_name="Value")
+            .dropna(subset=["Value"])
+        )
+        long["Period"] = pd.to_datetime(long["Period"])
+        long.insert(0, "Statement", name)
+        long.insert(0, "Ticker", ticker)
+        frames.append(long[STATEMENT_COLUMNS])
+    if not frames:
+        return pd.DataFrame(columns=STATEMENT_COLUMNS)
+    return pd.concat(frames, ignore_index=True)
+
+
+class TableWriter:
+    """Appends DataFrame chunks to a single Parquet, Arrow IPC or CSV file"""
+
+    def __init__(self, path, fmt, columns, schema=None):
+        self.fmt = fmt
+        self.schema = schema
+        self.rows = 0
+        if fmt == "Parquet":
+            self.writer = pq.ParquetWriter(path, schema, compression="zstd")
+        elif fmt == "Arrow IPC":
+            self.sink = pa.OSFile(path, "wb")
+            self.writer = pa.ipc.new_file(self.sink, schema, options=pa.ipc.IpcWriteOptions(compression="zstd"))
+        else:
+            self.file = open(path, "w", newline="")
+            pd.DataFrame(columns=columns).to_csv(self.file, index=False)
+
+    def write(self, frame):
+        for start in range(0, len(frame), CHUNK_ROWS):
+            chunk = frame.iloc[start:start + CHUNK_ROWS]
+            if self.fmt == "CSV":
+                chunk.to_csv(self.file, header=False, index=False)
+            else:
+                self.writer.write_table(pa.Table.from_pandas(chunk, schema=self.schema, preserve_index=False))
+            self.rows += len(chunk)
+
+    def close(self):
+        if self.fmt == "CSV":
+            self.file.close()
+        else:
+            self.writer.close()
+            if self.fmt == "Arrow IPC":
+                self.sink.close()
+
+
+def remove_old_bundles(directory, max_age=BUNDLE_MAX_AGE):
+    """Delete bundles and work folders in ``directory`` older than ``max_age`` seconds"""
+    cutoff = time.time() - max_age
+    for entry in os.scandir(directory):
+        try:
+            if entry.stat().st_mtime >= cutoff:
+                continue
+            if entry.is_dir():
+                shutil.rmtree(entry.path, ignore_errors=True)
+            else:
+                os.remove(entry.path)
+        except FileNotFoundError:
+            pass    # removed by another session meanwhile
+
+
+def write_bundle(path, tickers, load, fmt="Parquet", progress=None):
+    """Write a zipped bundle of bars and statements for ``tickers`` to ``path``
+
+    ``load(ticker)`` returns the ticker's stock data dict (with ``hist``) or
+    None. ``progress(done, total)`` is called after each ticker. Returns the
+    tickers that had no data.
+    """
+    if fmt not in available_formats():
+        raise ValueError(f"{fmt} export needs pyarrow; use CSV instead")
+
+    ext = FORMATS[fmt]
+    bar_schema, statement_schema = _schemas() if pa is not None else (None, None)
+    workdir = tempfile.mkdtemp(dir=os.path.dirname(os.path.abspath(path)))
+    skipped = []
+    try:
+        bars = TableWriter(os.path.join(workdir, "bars" + ext), fmt, BAR_COLUMNS, bar_schema)
+        statements = TableWriter(os.path.join(workdir, "statements" + ext), fmt, STATEMENT_COLUMNS, statement_schema)
+        try:
+            for i, ticker in enumerate(tickers, 1):
+                stock_data = load(ticker)
+                if stock_data is None or stock_data['hist'].empty:
+                    skipped.append(ticker)
+                else:
+                    bars.write(bars_frame(ticker, stock_data['hist']))
+                    statements.write(statements_frame(ticker, stock_data))
+                if progress:
+                    progress(i, len(tickers))
+        finally:
+            bars.close()
+            statements.close()
+
+        # Columnar files are already compressed; only CSV benefits from deflate
+        compression = zipfile.ZIP_DEFLATED if fmt == "CSV" else zipfile.ZIP_STORED
+        with zipfile.ZipFile(path, "w", compression=compression) as bundle:
+            for name in ("bars" + ext, "statements" + ext):
+                bundle.write(os.path.join(workdir, name), name)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return skipped
@@ -0,0 +1,256 @@
+"""Concurrent-session load test for the Streamlit dashboard
+
+Drives simulated sessions through ``Stock_Dashboard.py`` with Streamlit's
+``AppTest``: search, pick a ticker, change the date range, read every tab and
+toggle Annual/Quarterly on the Financials and Valuation tabs. Yahoo Finance is
+replaced by a deterministic offline stand-in and the cache directory by a
+temporary one, so runs are repeatable and never touch upstream.
+
+Every concurrency level starts cold, with its own cache directory and empty
+Streamlit caches, so levels are comparable. The offline stand-in is not rate
+limited unless ``--upstream-rate`` is given, so latencies measure the
+dashboard rather than the token bucket's sleeps.
+
+Switching tabs happens in the browser without a rerun; ``AppTest`` renders all
+tabs on every run, so tab content is exercised by every rerun.
+
+    python load_test.py --sessions 1 2 4 8 16 --iterations 3
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from contextlib import nullcontext
+from unittest.mock import MagicMock
+
+# Must be set before the dashboard's modules are imported
+os.environ.setdefault("EQUITYX_CACHE_DIR", tempfile.mkdtemp(prefix="equityx-load-"))
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+import yfinance as yf
+from streamlit import config
+from streamlit.runtime import Runtime
+from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager
+from streamlit.runtime.media_file_manager import MediaFileManager
+from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+from streamlit.testing.v1 import AppTest
+from streamlit.testing.v1 import app_test
+
+import storage
+import upstream
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Stock_Dashboard.py")
+SEARCH_TERMS = ["REL", "TATA", "BANK", "INFY", "PHARMA", "LIMITED"]
+HISTORY_BARS = 20 * 252
+RERUN_TIMEOUT = 120
+UNLIMITED_RATE = 1e9
+
+
+class OfflineTicker:
+    """Deterministic stand-in for ``yf.Ticker`` built from the symbol's hash"""
+
+    def __init__(self, ticker):
+        self.ticker = ticker
+        self.seed = zlib.crc32(ticker.encode())
+
+    def _bars(self):
+        rng = np.random.default_rng(self.seed)
+        index = pd.bdate_range(end=pd.Timestamp.today().normalize(), periods=HISTORY_BARS)
+        close = 100 * np.exp(np.cumsum(rng.normal(0.0003, 0.015, len(index))))
+        spread = close * rng.uniform(0, 0.01, len(index))
+        return pd.DataFrame({
+            "Open": close + rng.normal(0, 1, len(index)) * spread,
+            "High": close + spread,
+            "Low": close - spread,
+            "Close": close,
+            "Volume": rng.integers(100_000, 5_000_000, len(index)),
+            "Dividends": 0.0,
+            "Stock Splits": 0.0,
+        }, index=index)
+
+    def history(self, period=None, start=None, **kwargs):
+        bars = self._bars()
+        return bars[bars.index >= pd.Timestamp(start)] if start is not None else bars
+
+    @property
+    def info(self):
+        close = self._bars()["Close"]
+        return {
+            "shortName": self.ticker,
+            "longName": f"{self.ticker} (offline)",
+            "currentPrice": float(close.iloc[-1]),
+            "marketCap": int(close.iloc[-1] * 1e9),
+            "sector": "Offline",
+            "fiftyTwoWeekHigh": float(close.iloc[-252:].max()),
+            "fiftyTwoWeekLow": float(close.iloc[-252:].min()),
+            "volume": 1_000_000,
+            "averageVolume": 1_200_000,
+            "longBusinessSummary": "Synthetic company used for load testing.",
+        }
+
+    def _statement(self, rows, periods, freq, scale):
+        rng = np.random.default_rng(self.seed + len(rows) + periods)
+        columns = pd.date_range(end=pd.Timestamp.today().normalize(), periods=periods, freq=freq)[::-1]
+        values = {row: rng.uniform(0.5, 1.5, periods) * scale * weight for row, weight in rows.items()}
+        return pd.DataFrame(values, index=columns).T
+
+    def _financials(self, periods, freq, scale):
+        return self._statement({
+            "Total Revenue": 1.0, "Gross Profit": 0.4, "Operating Income": 0.2,
+            "EBITDA": 0.25, "Net Income": 0.12,
+        }, periods, freq, scale)
+
+    def _balance_sheet(self, periods, freq):
+        return self._statement({
+            "Stockholders Equity": 1.0, "Total Assets": 2.5, "Total Debt": 0.6,
+            "Cash And Cash Equivalents": 0.2, "Ordinary Shares Number": 1e-2,
+        }, periods, freq, 1e11)
+
+    def _cashflow(self, periods, freq, scale):
+        return self._statement({
+            "Operating Cash Flow": 0.15, "Free Cash Flow": 0.08, "Cash Dividends Paid": -0.03,
+        }, periods, freq, scale)
+
+    financials = property(lambda self: self._financials(4, "YE", 1e11))
+    balance_sheet = property(lambda self: self._balance_sheet(4, "YE"))
+    cashflow = property(lambda self: self._cashflow(4, "YE", 1e11))
+    quarterly_financials = property(lambda self: self._financials(8, "QE", 2.5e10))
+    quarterly_balance_sheet = property(lambda self: self._balance_sheet(8, "QE"))
+    quarterly_cashflow = property(lambda self: self._cashflow(8, "QE", 2.5e10))
+
+
+def share_runtime():
+    """Pin one Runtime and script cache for every session, as a real server has
+
+    ``AppTest`` swaps a fresh mock Runtime singleton in and out around each
+    run, recompiles the script every time and sets the global ``appTest``
+    option only for the duration of a run, so concurrent sessions would tear
+    down each other's runtime, race in the compiler and switch the option off
+    under each other's runs.
+    """
+    shared = MagicMock(spec=Runtime)
+    shared.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+    shared.cache_storage_manager = MemoryCacheStorageManager()
+    Runtime.instance = classmethod(lambda cls: shared)
+    Runtime.exists = classmethod(lambda cls: True)
+
+    scripts = ScriptCache()
+    get_bytecode = ScriptCache.get_bytecode
+    ScriptCache.get_bytecode = lambda self, script_path: get_bytecode(scripts, script_path)
+
+    config.set_option("global.appTest", True)
+    app_test.patch_config_options = lambda overrides: nullcontext()
+
+
+def _rss_mb():
+    """Current resident set size in MB (Linux), else the peak"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_session(session_id, iterations, latencies, errors):
+    """One simulated user walking through the dashboard"""
+    rng = random.Random(session_id)
+
+    def rerun(step):
+        start = time.perf_counter()
+        step().run(timeout=RERUN_TIMEOUT)
+        latencies.append(time.perf_counter() - start)
+        if at.exception:
+            errors.append(str(at.exception[0].value))
+
+    at = AppTest.from_file(APP_PATH, default_timeout=RERUN_TIMEOUT)
+    rerun(lambda: at)
+    for _ in range(iterations):
+        rerun(lambda: at.sidebar.text_input[0].input(rng.choice(SEARCH_TERMS)))
+        if not at.sidebar.selectbox:
+            continue
+        choices = at.sidebar.selectbox[0].options
+        rerun(lambda: at.sidebar.selectbox[0].select(rng.choice(choices)))
+        if not at.date_input:
+            continue
+        rerun(lambda: at.date_input[0].set_value(date.today() - timedelta(days=rng.choice([90, 365, 1825]))))
+        for period in ("Quarterly", "Annual"):
+            for radio in range(len(at.radio)):
+                rerun(lambda: at.radio[radio].set_value(period))
+
+
+def cold_start(sessions, upstream_rate=None):
+    """Fresh cache directory, empty Streamlit caches and a new upstream client"""
+    storage.CACHE_DIR = tempfile.mkdtemp(prefix=f"{sessions}-sessions-", dir=os.environ["EQUITYX_CACHE_DIR"])
+    st.cache_data.clear()
+    st.cache_resource.clear()
+    rate = upstream_rate or UNLIMITED_RATE
+    upstream._client = upstream.UpstreamClient(rate=rate, burst=max(1, int(rate)))
+    print(f"cache: {storage.CACHE_DIR}", file=sys.stderr)
+
+
+def run_level(sessions, iterations):
+    """Run ``sessions`` concurrent sessions and summarise their reruns"""
+    latencies, errors = [], []
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=sessions) as pool:
+        futures = [pool.submit(run_session, i, iterations, latencies, errors) for i in range(sessions)]
+        for future in futures:
+            try:
+                future.result()
+            except Exception as e:
+                errors.append(f"session crashed: {e}")
+    elapsed = time.perf_counter() - start
+
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000 if latencies else (np.nan,) * 3
+    return {
+        "sessions": sessions,
+        "reruns": len(latencies),
+        "errors": len(errors),
+        "throughput_per_s": len(latencies) / elapsed,
+        "p50_ms": p50,
+        "p95_ms": p95,
+        "p99_ms": p99,
+        "rss_mb": _rss_mb(),
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the EquityX dashboard")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--iterations", type=int, default=3, help="flows per session")
+    parser.add_argument("--upstream-rate", type=float,
+                        help="rate limit the offline upstream to this many requests/second (default: unlimited)")
+    parser.add_argument("--json", help="also write results to this file")
+    args = parser.parse_args()
+
+    yf.Ticker = OfflineTicker
+    share_runtime()
+
+    header = f"{'sessions':>8} {'reruns':>7} {'errors':>6} {'rerun/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'rss MB':>8}"
+    print(header)
+    results = []
+    for sessions in args.sessions:
+        cold_start(sessions, args.upstream_rate)
+        r = run_level(sessions, args.iterations)
+        results.append(r)
+        print(f"{r['sessions']:>8} {r['reruns']:>7} {r['errors']:>6} {r['throughput_per_s']:>8.2f} "
+              f"{r['p50_ms']:>8.0f} {r['p95_ms']:>8.0f} {r['p99_ms']:>8.0f} {r['rss_mb']:>8.0f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
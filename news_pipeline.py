@@ -0,0 +1,227 @@
+"""News ingestion and sentiment scoring pipeline
+
+Pulls feeds for many tickers concurrently, drops duplicate articles by content
+hash and scores sentiment in batches, caching the score of every article. The
+dashboard never scores anything itself, it only reads the per-ticker sentiment
+series written here.
+
+Feeds are read from local files in ``news_feeds/<TICKER>.xml`` when present,
+otherwise from a Google News search feed:
+
+    python news_pipeline.py RELIANCE.NS TCS.NS
+    python news_pipeline.py --offline          # every ticker with a local feed
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote_plus, urlparse
+
+import feedparser
+import pandas as pd
+from textblob import TextBlob
+
+import upstream
+from storage import cache_path, temp_path
+
+FEED_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "news_feeds")
+FEED_EXTENSIONS = (".xml", ".rss", ".atom")
+FEED_URL = "https://news.google.com/rss/search?q={query}&hl=en-IN&gl=IN&ceid=IN:en"
+SCORE_BATCH_SIZE = 64
+MAX_WORKERS = 8
+
+ARTICLE_COLUMNS = ["hash", "published", "title", "summary", "link", "sentiment"]
+SENTIMENT_COLUMNS = ["sentiment", "articles"]
+
+
+def content_hash(title, summary):
+    """Stable hash of an article's normalised text, used for deduplication"""
+    text = re.sub(r"\s+", " ", f"{title} {summary}").strip().lower()
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def _strip_html(text):
+    return re.sub(r"\s+", " ", re.sub(r"<[^>]+>", " ", text or "")).strip()
+
+
+def feed_source(ticker, feed_dir=FEED_DIR):
+    """Local feed file for the ticker if one exists, otherwise the search feed URL"""
+    for ext in FEED_EXTENSIONS:
+        path = os.path.join(feed_dir, ticker + ext)
+        if os.path.exists(path):
+            return path
+    query = ticker.split(".")[0]
+    return FEED_URL.format(query=quote_plus(f"{query} share"))
+
+
+def _parse_remote(url):
+    parsed = feedparser.parse(url)
+    if parsed.get("status", 200) >= 400:
+        raise IOError(f"HTTP {parsed.status} for {url}")
+    return parsed
+
+
+def fetch_feed(ticker, feed_dir=FEED_DIR, offline=False):
+    """Parse one ticker's feed into a list of article dicts"""
+    source = feed_source(ticker, feed_dir)
+    if os.path.exists(source):
+        parsed = feedparser.parse(source)
+    elif offline:
+        return []
+    else:
+        try:
+            parsed = upstream.get_client().call(urlparse(source).netloc, _parse_remote, source)
+        except Exception as e:
+            print(f"{ticker}: feed unavailable ({e})", file=sys.stderr)
+            return []
+
+    articles = []
+    for entry in parsed.entries:
+        title = _strip_html(entry.get("title", ""))
+        summary = _strip_html(entry.get("summary", ""))
+        if not title:
+            continue
+        published = entry.get("published_parsed") or entry.get("updated_parsed")
+        articles.append({
+            "hash": content_hash(title, summary),
+            "published": pd.Timestamp(*published[:6]) if published else pd.NaT,
+            "title": title,
+            "summary": summary,
+            "link": entry.get("link", ""),
+        })
+    return articles
+
+
+def fetch_feeds(tickers, feed_dir=FEED_DIR, offline=False, max_workers=MAX_WORKERS):
+    """Fetch feeds for many tickers concurrently, deduplicated within each ticker"""
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        results = pool.map(lambda t: fetch_feed(t, feed_dir, offline), tickers)
+        feeds = dict(zip(tickers, results))
+
+    for ticker, articles in feeds.items():
+        unique = {}
+        for article in articles:
+            unique.setdefault(article["hash"], article)
+        feeds[ticker] = list(unique.values())
+    return feeds
+
+
+def _load_scores():
+    path = cache_path("news", "scores.json")
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def _save_scores(scores):
+    path = cache_path("news", "scores.json")
+    tmp = temp_path(path)
+    with open(tmp, "w") as f:
+        json.dump(scores, f)
+    os.replace(tmp, path)
+
+
+def score_articles(articles, batch_size=SCORE_BATCH_SIZE):
+    """Attach sentiment polarity to articles, scoring only uncached ones
+
+    Articles shared between tickers are scored once. The score cache is
+    written after every batch so an interrupted run keeps its progress.
+    """
+    scores = _load_scores()
+    pending = {a["hash"]: a for a in articles if a["hash"] not in scores}
+    pending = list(pending.items())
+
+    for start in range(0, len(pending), batch_size):
+        batch = pending[start:start + batch_size]
+        scores.update({
+            h: TextBlob(f"{a['title']}. {a['summary']}").sentiment.polarity
+            for h, a in batch
+        })
+        _save_scores(scores)
+
+    for article in articles:
+        article["sentiment"] = scores[article["hash"]]
+    return articles
+
+
+def _ticker_path(ticker, name):
+    return cache_path("news", ticker, name)
+
+
+def load_articles(ticker):
+    """Stored articles for a ticker, newest first"""
+    path = _ticker_path(ticker, "articles.csv")
+    if not os.path.exists(path):
+        return pd.DataFrame(columns=ARTICLE_COLUMNS)
+    articles = pd.read_csv(path, parse_dates=["published"])
+    return articles.sort_values("published", ascending=False)
+
+
+def load_sentiment_series(ticker):
+    """Precomputed daily mean sentiment and article count for a ticker"""
+    path = _ticker_path(ticker, "sentiment.csv")
+    if not os.path.exists(path):
+        return pd.DataFrame(columns=SENTIMENT_COLUMNS)
+    return pd.read_csv(path, index_col=0, parse_dates=True)
+
+
+def _write_csv(frame, path, **kwargs):
+    """Atomically replace a CSV the dashboard may be reading"""
+    tmp = temp_path(path)
+    frame.to_csv(tmp, **kwargs)
+    os.replace(tmp, path)
+
+
+def write_ticker_news(ticker, articles):
+    """Merge new articles into the ticker's store and rebuild its daily series"""
+    new = pd.DataFrame(articles, columns=ARTICLE_COLUMNS)
+    stored = load_articles(ticker)
+    merged = pd.concat([stored, new], ignore_index=True) if not stored.empty else new
+    merged["published"] = pd.to_datetime(merged["published"])
+    merged = merged.drop_duplicates("hash", keep="last").sort_values("published")
+    _write_csv(merged, _ticker_path(ticker, "articles.csv"), index=False)
+
+    dated = merged.dropna(subset=["published"])
+    series = dated.groupby(dated["published"].dt.normalize())["sentiment"].agg(["mean", "count"])
+    series.columns = SENTIMENT_COLUMNS
+    series.index.name = "date"
+    _write_csv(series, _ticker_path(ticker, "sentiment.csv"))
+    return series
+
+
+def run_pipeline(tickers, feed_dir=FEED_DIR, offline=False, max_workers=MAX_WORKERS):
+    """Ingest, score and store news for every ticker; returns article counts"""
+    feeds = fetch_feeds(tickers, feed_dir, offline, max_workers)
+    score_articles([a for articles in feeds.values() for a in articles])
+    for ticker, articles in feeds.items():
+        if articles:
+            write_ticker_news(ticker, articles)
+    return {ticker: len(articles) for ticker, articles in feeds.items()}
+
+
+def local_feed_tickers(feed_dir=FEED_DIR):
+    """Tickers that have a local feed file"""
+    if not os.path.isdir(feed_dir):
+        return []
+    return sorted(
+        os.path.splitext(name)[0] for name in os.listdir(feed_dir)
+        if name.endswith(FEED_EXTENSIONS)
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingest and score news for the dashboard")
+    parser.add_argument("tickers", nargs="*", help="defaults to every ticker with a local feed")
+    parser.add_argument("--feed-dir", default=FEED_DIR)
+    parser.add_argument("--offline", action="store_true", help="only read local feed files")
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS)
+    args = parser.parse_args()
+
+    tickers = args.tickers or local_feed_tickers(args.feed_dir)
+    counts = run_pipeline(tickers, args.feed_dir, args.offline, args.workers)
+    for ticker, count in counts.items():
+        print(f"{ticker}: {count} articles")
@@ -0,0 +1,92 @@
+"""Incremental on-disk store of daily price history
+
+The first request for a ticker downloads its full history. Later requests only
+download the bars since the last stored date and merge them in, with new
+splits, bonus issues and dividends back-applied to the stored rows by
+``corporate_actions``. A full reload only happens when the refetched overlap
+does not line up with the stored history.
+"""
+import os
+import time
+
+import pandas as pd
+
+import corporate_actions
+from storage import cache_path, temp_path
+
+OVERLAP_BARS = 5               # stored bars refetched to verify the join
+MATCH_TOLERANCE = 0.005        # relative close mismatch that forces a reload
+REFRESH_INTERVAL = 15 * 60     # seconds before a stored history is refreshed
+
+
+def _path(ticker):
+    return cache_path("prices", f"{ticker}.pkl")
+
+
+def _tz_naive(hist):
+    if hist.index.tz is not None:
+        hist.index = hist.index.tz_localize(None)
+    return hist
+
+
+def load_history(ticker):
+    """Stored history for a ticker, or an empty frame"""
+    path = _path(ticker)
+    if not os.path.exists(path):
+        return pd.DataFrame()
+    return pd.read_pickle(path)
+
+
+def save_history(ticker, hist):
+    """Atomically replace the stored history for a ticker"""
+    path = _path(ticker)
+    tmp = temp_path(path)
+    hist.to_pickle(tmp)
+    os.replace(tmp, path)
+
+
+def is_fresh(ticker):
+    """Whether the stored history was refreshed within REFRESH_INTERVAL"""
+    path = _path(ticker)
+    return os.path.exists(path) and time.time() - os.path.getmtime(path) < REFRESH_INTERVAL
+
+
+def _overlap_matches(stored, bars, merged):
+    """Check refetched overlap bars against the stored ones after adjustment
+
+    The last stored bar is left out: it may have been the partial session
+    still trading, whose close legitimately moved since it was stored.
+    """
+    overlap = stored.index[:-1].intersection(bars.index)
+    kept = stored.index[stored.index < bars.index[0]]
+    if overlap.empty or kept.empty:
+        return True
+    factor = merged.at[kept[-1], "Close"] / stored.at[kept[-1], "Close"]
+    expected = stored.loc[overlap, "Close"] * factor
+    mismatch = (bars.loc[overlap, "Close"] / expected - 1).abs()
+    return bool((mismatch < MATCH_TOLERANCE).all())
+
+
+def update_history(ticker, history):
+    """Bring a ticker's stored history up to date and return it
+
+    ``history`` downloads bars like ``yf.Ticker.history``; callers wrap only
+    it in the upstream client, so reading and merging the store never counts
+    as an upstream failure. Only bars from shortly before the last stored
+    date are downloaded unless the store is empty or inconsistent.
+    """
+    stored = load_history(ticker)
+    if stored.empty:
+        hist = _tz_naive(history(period="max"))
+    elif is_fresh(ticker):
+        return stored
+    else:
+        start = stored.index[-min(OVERLAP_BARS, len(stored))]
+        bars = _tz_naive(history(start=start))
+        hist, _ = corporate_actions.merge_adjusted(stored, bars)
+        if not bars.empty and not _overlap_matches(stored, bars, hist):
+            hist = _tz_naive(history(period="max"))
+
+    if not hist.empty:
+        save_history(ticker, hist)
+    return hist
@@ -0,0 +1,133 @@
+"""Historical valuation and profitability ratios from financial statements
+
+Ratios are derived as a time series over statement periods from the
+``financials``, ``balance_sheet`` and ``cashflow`` frames returned by yfinance,
+joined with closing prices at each period end. Everything is computed column
+wise across periods, so no per-period loops or extra ``info`` calls are needed.
+"""
+import numpy as np
+import pandas as pd
+
+# Candidate statement rows for each item, in order of preference
+INCOME_ITEMS = {
+    "revenue": ["Total Revenue", "Operating Revenue"],
+    "gross_profit": ["Gross Profit"],
+    "operating_income": ["Operating Income", "EBIT"],
+    "ebitda": ["EBITDA", "Normalized EBITDA"],
+    "net_income": ["Net Income", "Net Income Common Stockholders"],
+}
+CASHFLOW_ITEMS = {
+    "dividends": ["Cash Dividends Paid", "Common Stock Dividend Paid"],
+}
+BALANCE_ITEMS = {
+    "equity": ["Stockholders Equity", "Common Stock Equity"],
+    "assets": ["Total Assets"],
+    "debt": ["Total Debt"],
+    "cash": ["Cash And Cash Equivalents", "Cash Cash Equivalents And Short Term Investments"],
+    "shares": ["Ordinary Shares Number", "Share Issued"],
+}
+
+VALUATION_RATIOS = ["P/E", "P/B", "P/S", "EV/EBITDA", "Dividend Yield"]
+PROFITABILITY_RATIOS = ["ROE", "ROA", "Operating Margin", "Gross Margin"]
+PERCENT_RATIOS = ["Dividend Yield"] + PROFITABILITY_RATIOS
+
+
+def statement_items(statement, items):
+    """Pick the first available row for each item, as a frame indexed by period end"""
+    frame = pd.DataFrame(index=pd.DatetimeIndex(statement.columns))
+    for name, rows in items.items():
+        row = next((r for r in rows if r in statement.index), None)
+        frame[name] = pd.to_numeric(statement.loc[row], errors="coerce") if row else np.nan
+    return frame.sort_index()
+
+
+def action_factors(prices, splits=None, dividends=None):
+    """Factor each later split or dividend applied to the prices before its date
+
+    A split of ratio R scales earlier prices by ``1 / R`` and a dividend D by
+    ``1 - D / prior close``. ``prices`` are already adjusted for the later
+    dividends, so actions are walked newest first to recover each prior close,
+    just as ``corporate_actions`` does when it back-adjusts the stored history.
+    """
+    factors = {}
+    dividend_factor = 1.0
+    empty = pd.Series(dtype=float)
+    splits = (splits if splits is not None else empty).fillna(0)
+    dividends = (dividends if dividends is not None else empty).fillna(0)
+    dates = splits.index[splits > 0].union(dividends.index[dividends > 0])
+    for date in dates[::-1]:
+        factor = 1.0
+        dividend = dividends.get(date, 0.0)
+        pos = prices.index.searchsorted(date)
+        if dividend > 0 and pos > 0:
+            prior_close = prices.iloc[pos - 1] / dividend_factor + dividend
+            factor = 1 - dividend / prior_close
+            dividend_factor *= factor
+        if splits.get(date, 0.0) > 0:
+            factor /= splits[date]
+        factors[date] = factor
+    return pd.Series(factors, dtype=float).sort_index()
+
+
+def unadjusted_prices(prices, dates, splits=None, dividends=None):
+    """Prices at ``dates`` as they traded then, undoing later splits and dividends
+
+    ``prices`` come from ``history()`` adjusted for every split and dividend up
+    to the latest bar, while share counts are reported as of each period end,
+    so every price is divided by the product of the action factors after its
+    date.
+    """
+    price = pd.Series(prices.asof(dates).to_numpy(), index=dates)
+    factors = action_factors(prices, splits, dividends)
+    if factors.empty:
+        return price
+    through = factors.cumprod()
+    before = pd.Series(through.asof(dates).to_numpy(), index=dates).fillna(1.0)
+    return price * before / through.iloc[-1]
+
+
+def compute_ratios(financials, balance_sheet, cashflow, prices, quarterly=False, splits=None, dividends=None):
+    """Ratio time series indexed by period end
+
+    ``prices`` is a Series of adjusted closing prices, and ``splits`` and
+    ``dividends`` the matching ``Stock Splits`` and ``Dividends`` columns, used
+    to price each period as it traded against the share count it reported.
+    For quarterly statements the income and cash flow items are summed over
+    the trailing four quarters so the ratios stay comparable with annual
+    figures.
+    """
+    flows = statement_items(financials, INCOME_ITEMS).join(
+        statement_items(cashflow, CASHFLOW_ITEMS), how="outer"
+    )
+    if quarterly:
+        flows = flows.rolling(4, min_periods=4).sum()
+    data = flows.join(statement_items(balance_sheet, BALANCE_ITEMS), how="outer")
+
+    if data.empty:
+        return pd.DataFrame(columns=VALUATION_RATIOS + PROFITABILITY_RATIOS)
+
+    price = unadjusted_prices(prices.dropna().sort_index(), data.index, splits, dividends)
+    market_cap = price * data["shares"]
+    enterprise_value = market_cap + data["debt"].fillna(0) - data["cash"].fillna(0)
+    positive = lambda s: s.where(s > 0)
+
+    ratios = pd.DataFrame({
+        "P/E": market_cap / positive(data["net_income"]),
+        "P/B": market_cap / positive(data["equity"]),
+        "P/S": market_cap / positive(data["revenue"]),
+        "EV/EBITDA": enterprise_value / positive(data["ebitda"]),
+        "Dividend Yield": data["dividends"].abs() / market_cap,
+        "ROE": data["net_income"] / positive(data["equity"]),
+        "ROA": data["net_income"] / positive(data["assets"]),
+        "Operating Margin": data["operating_income"] / positive(data["revenue"]),
+        "Gross Margin": data["gross_profit"] / positive(data["revenue"]),
+    }, index=data.index.rename("Period"))
+    return ratios.replace([np.inf, -np.inf], np.nan).dropna(how="all")
+
+
+def latest(ratios, column):
+    """Most recent non-missing value of a ratio and its period end, or ``(None, None)``"""
+    if column not in ratios:
+        return None, None
+    values = ratios[column].dropna()
+    return (values.iloc[-1], values.index[-1]) if not values.empty else (None, None)
@@ -0,0 +1,20 @@
+"""Local on-disk cache shared by the dashboard's data pipelines"""
+import os
+import uuid
+
+CACHE_DIR = os.environ.get(
+    "EQUITYX_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache")
+)
+
+
+def cache_path(*parts):
+    """Return a path inside the cache directory, creating its parent folders"""
+    path = os.path.join(CACHE_DIR, *parts)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return path
+
+
+def temp_path(path):
+    """Unique sibling of ``path`` to write before an atomic ``os.replace``"""
+    return f"{path}.{uuid.uuid4().hex}.tmp"
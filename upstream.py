@@ -0,0 +1,226 @@
+"""Resilient access to upstream data providers
+
+Every upstream call goes through an ``UpstreamClient``, which applies per host:
+
+* an adaptive token bucket, which halves its rate when the host throttles and
+  slowly recovers on success,
+* jittered exponential retries, bounded by an overall deadline,
+* a circuit breaker that fails fast while a host keeps failing.
+
+Callers fall back to the last-known-good copy saved with ``save_last_good``
+when a call still fails.
+"""
+import os
+import pickle
+import random
+import re
+import threading
+import time
+
+from storage import cache_path, temp_path
+
+YAHOO_HOST = "finance.yahoo.com"
+
+
+class UpstreamUnavailableError(RuntimeError):
+    """Raised instead of calling a host that is failing or over its rate budget"""
+
+
+def is_throttled(error):
+    """Whether an exception looks like upstream rate limiting"""
+    text = f"{type(error).__name__} {error}".lower()
+    return any(marker in text for marker in ("ratelimit", "rate limit", "429", "too many requests"))
+
+
+def is_transient(error):
+    """Whether an exception is worth retrying: network, timeout, 5xx or throttling
+
+    Anything else, such as a parsing error in the caller, says nothing about
+    the host's health and is raised straight away.
+    """
+    if is_throttled(error) or isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    response = getattr(error, "response", None)
+    status = getattr(response, "status_code", None) or getattr(error, "status", None)
+    if isinstance(status, int):
+        return 500 <= status < 600
+    text = f"{type(error).__name__} {error}".lower()
+    if any(marker in text for marker in ("timeout", "timed out", "connectionerror", "connection reset",
+                                         "connection refused", "connection aborted")):
+        return True
+    return re.search(r"\b(http|status)\W*5\d\d\b", text) is not None
+
+
+class TokenBucket:
+    """Token bucket whose refill rate adapts to upstream throttling"""
+
+    def __init__(self, rate, capacity, min_rate=0.1):
+        self.max_rate = rate
+        self.min_rate = min_rate
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, deadline=None):
+        """Block until a token is available; False if that would pass ``deadline``"""
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                wait = (1 - self.tokens) / self.rate
+            if deadline is not None and time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+    def slow_down(self):
+        """Halve the rate after the host throttled us"""
+        with self.lock:
+            self._refill()
+            self.rate = max(self.min_rate, self.rate / 2)
+
+    def speed_up(self):
+        """Recover the rate additively after a success"""
+        with self.lock:
+            self._refill()
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 10)
+
+
+class CircuitBreaker:
+    """Opens after consecutive failures and lets one trial call through after a cool-down"""
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self.lock = threading.Lock()
+
+    def allow(self):
+        """Whether a call may proceed now"""
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at < self.reset_timeout or self.trial_running:
+                return False
+            self.trial_running = True    # half-open
+            return True
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_running = False
+
+    def release(self):
+        """End a call that says nothing about the host's health"""
+        with self.lock:
+            self.trial_running = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.trial_running or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self.trial_running = False
+
+
+class UpstreamClient:
+    """Rate-limited, retrying, circuit-broken calls keyed by upstream host"""
+
+    def __init__(self, rate=2.0, burst=5, retries=3, base_delay=0.5, max_delay=8.0,
+                 deadline=20.0, failure_threshold=5, reset_timeout=60.0):
+        self.rate = rate
+        self.burst = burst
+        self.retries = retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.hosts = {}
+        self.lock = threading.Lock()
+
+    def _host(self, host):
+        with self.lock:
+            if host not in self.hosts:
+                self.hosts[host] = (
+                    TokenBucket(self.rate, self.burst),
+                    CircuitBreaker(self.failure_threshold, self.reset_timeout),
+                )
+            return self.hosts[host]
+
+    def call(self, host, fn, *args, **kwargs):
+        """Call ``fn(*args, **kwargs)`` against ``host``, retrying transient failures
+
+        ``fn`` should only do the upstream request; keep local work outside it.
+        Raises ``UpstreamUnavailableError`` when the host's circuit is open or
+        its rate budget would push the call past the deadline, otherwise the
+        last exception once retries or the deadline are exhausted. Only a call
+        that finally fails with a transient error counts against the circuit.
+        """
+        bucket, breaker = self._host(host)
+        give_up_at = time.monotonic() + self.deadline
+        if not breaker.allow():
+            raise UpstreamUnavailableError(f"{host} is failing, retrying in up to {self.reset_timeout:.0f}s")
+
+        for attempt in range(self.retries + 1):
+            if not bucket.acquire(give_up_at):
+                if attempt:
+                    breaker.record_failure()
+                else:
+                    breaker.release()
+                raise UpstreamUnavailableError(f"{host} is throttled, try again shortly")
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                if not is_transient(e):
+                    breaker.release()
+                    raise
+                if is_throttled(e):
+                    bucket.slow_down()
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+                if attempt == self.retries or time.monotonic() + delay > give_up_at:
+                    breaker.record_failure()
+                    raise
+                time.sleep(delay)
+            else:
+                breaker.record_success()
+                bucket.speed_up()
+                return result
+
+
+_client = UpstreamClient()
+
+
+def get_client():
+    """Process-wide client, shared by every session"""
+    return _client
+
+
+def save_last_good(key, value):
+    """Keep a copy of a successful upstream result for fallback"""
+    path = cache_path("last_good", f"{key}.pkl")
+    tmp = temp_path(path)
+    with open(tmp, "wb") as f:
+        pickle.dump((time.time(), value), f)
+    os.replace(tmp, path)
+
+
+def load_last_good(key):
+    """Last saved result and its timestamp, or ``(None, None)``"""
+    path = cache_path("last_good", f"{key}.pkl")
+    if not os.path.exists(path):
+        return None, None
+    with open(path, "rb") as f:
+        saved_at, value = pickle.load(f)
+    return value, saved_at
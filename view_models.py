@@ -0,0 +1,237 @@
+"""Precomputed per-ticker view models for the dashboard page
+
+Everything on the ticker page that depends only on the fetched data is built
+once per data version: Plotly figures serialized as JSON, formatted metric
+strings, and crore-converted statements encoded as Arrow IPC. The dashboard
+caches a view model per ticker and ``fingerprint``, so a rerun is mostly a
+lookup, and its cost no longer grows with the length of the history. Metrics
+read from the live ``info`` (price, overview, ratio fallbacks) change on almost
+every fetch, so they are formatted separately by ``live_view``.
+"""
+import hashlib
+from datetime import date, datetime, timedelta
+
+import pandas as pd
+import plotly.express as px
+import pyarrow as pa
+
+import ratios
+
+DEFAULT_RANGE_DAYS = 365
+PERIODS = {"Annual": "", "Quarterly": "quarterly_"}
+
+# info fields used when a ratio cannot be derived from the statements
+INFO_RATIO_KEYS = {
+    "P/E": 'trailingPE',
+    "P/B": 'priceToBook',
+    "P/S": 'priceToSalesTrailing12Months',
+    "EV/EBITDA": 'enterpriseToEbitda',
+    "Dividend Yield": 'dividendYield',
+    "ROE": 'returnOnEquity',
+    "ROA": 'returnOnAssets',
+    "Operating Margin": 'operatingMargins',
+    "Gross Margin": 'grossMargins',
+}
+
+
+def to_crores(x):
+    """Convert numbers to Crores (Indian numbering system)"""
+    return x / 10000000
+
+
+def format_ratio(metric, value):
+    """Format a ratio for display, as a percentage where appropriate"""
+    if value is None or pd.isna(value):
+        return "N/A"
+    return f"{value*100:.2f}%" if metric in ratios.PERCENT_RATIOS else f"{value:,.2f}"
+
+
+def encode_table(frame):
+    """Serialize a DataFrame to Arrow IPC stream bytes"""
+    table = pa.Table.from_pandas(frame, preserve_index=True)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def decode_table(data):
+    """Read a DataFrame back from Arrow IPC stream bytes"""
+    return pa.ipc.open_stream(data).read_all().to_pandas()
+
+
+def fingerprint(stock_data):
+    """Cheap identity of the data a view model is built from
+
+    Uses the history's length, last bar and first close (which moves when a
+    split or dividend is back-applied) rather than hashing the whole history.
+    Live ``info`` fields are left out, only the name used in chart titles is
+    kept.
+    """
+    hist = stock_data['hist']
+    parts = [date.today(), len(hist), hist.index[-1], hist['Close'].iloc[-1], hist['Close'].iloc[0]]
+    parts.append(stock_data['info'].get('shortName'))
+    for name, frame in sorted(stock_data.items()):
+        if name != 'hist' and isinstance(frame, pd.DataFrame) and not frame.empty:
+            parts.append((name, int(pd.util.hash_pandas_object(frame.astype(str)).sum())))
+    return hashlib.sha1(repr(parts).encode()).hexdigest()
+
+
+def default_range():
+    """Date range the page opens with"""
+    return date.today() - timedelta(days=DEFAULT_RANGE_DAYS), date.today()
+
+
+def technical_view(hist, start_date, end_date, title, colors):
+    """Price figure JSON and moving-average metrics for a date range"""
+    start_dt = datetime.combine(start_date, datetime.min.time())
+    end_dt = datetime.combine(end_date, datetime.min.time())
+    range_hist = hist[(hist.index >= start_dt) & (hist.index <= end_dt)].copy()
+    if range_hist.empty:
+        return {'figure': None, 'metrics': []}
+
+    # Calculate moving averages
+    range_hist['50MA'] = range_hist['Close'].rolling(50).mean()
+    range_hist['200MA'] = range_hist['Close'].rolling(200).mean()
+
+    fig = px.line(
+        range_hist,
+        x=range_hist.index,
+        y=['Close', '50MA', '200MA'],
+        title=title,
+        labels={'value': 'Price (₹)', 'variable': 'Metric'},
+        color_discrete_map={
+            'Close': colors['chart_line'],
+            '50MA': colors['chart_ma50'],
+            '200MA': colors['chart_ma200']
+        }
+    )
+
+    ma50, ma200 = range_hist['50MA'].iloc[-1], range_hist['200MA'].iloc[-1]
+    metrics = [
+        ("50-Day MA", f"₹{ma50:,.2f}" if not pd.isna(ma50) else "N/A"),
+        ("200-Day MA", f"₹{ma200:,.2f}" if not pd.isna(ma200) else "N/A"),
+    ]
+    if not pd.isna(ma50) and not pd.isna(ma200):
+        metrics.append(("MA Crossover", "Bullish" if ma50 > ma200 else "Bearish"))
+    return {'figure': fig.to_json(), 'metrics': metrics}
+
+
+def _overview(info, name):
+    return {
+        'title': info.get('longName', name),
+        'columns': [
+            [
+                ("Market Cap", f"₹{info.get('marketCap', 0)/1e7:,.0f} Cr" if info.get('marketCap') else "N/A"),
+                ("Sector", info.get('sector', 'N/A')),
+            ],
+            [
+                ("52W High", f"₹{info['fiftyTwoWeekHigh']:,.2f}" if info.get('fiftyTwoWeekHigh') else "N/A"),
+                ("52W Low", f"₹{info['fiftyTwoWeekLow']:,.2f}" if info.get('fiftyTwoWeekLow') else "N/A"),
+            ],
+            [
+                ("Volume", f"{info.get('volume', 'N/A'):,}" if isinstance(info.get('volume'), int) else "N/A"),
+                ("Avg. Volume", f"{info.get('averageVolume', 'N/A'):,}" if isinstance(info.get('averageVolume'), int) else "N/A"),
+            ],
+        ],
+        'summary': info.get('longBusinessSummary', 'No business description available.'),
+    }
+
+
+def _statement_table(frame):
+    if frame.empty:
+        return None
+    crores = frame.apply(pd.to_numeric, errors="coerce").apply(to_crores)
+    crores.columns = [c.strftime('%Y-%m-%d') if hasattr(c, 'strftime') else str(c) for c in crores.columns]
+    return encode_table(crores)
+
+
+def _ratio_view(stock_data, prefix):
+    ratio_history = ratios.compute_ratios(
+        stock_data[prefix + 'financials'],
+        stock_data[prefix + 'balance_sheet'],
+        stock_data[prefix + 'cashflow'],
+        stock_data['hist']['Close'],
+        prefix == "quarterly_",
+        stock_data['hist'].get('Stock Splits'),
+        stock_data['hist'].get('Dividends')
+    )
+
+    view = {
+        'latest': {m: ratios.latest(ratio_history, m) for m in ratios.VALUATION_RATIOS + ratios.PROFITABILITY_RATIOS},
+        'multiples_figure': None,
+        'margins_figure': None,
+    }
+    if not ratio_history.empty:
+        multiples = ratio_history[["P/E", "P/B", "P/S", "EV/EBITDA"]]
+        view['multiples_figure'] = px.line(
+            multiples, x=multiples.index, y=multiples.columns, markers=True,
+            title="Valuation Multiples",
+            labels={'value': 'Multiple (x)', 'variable': 'Metric'}
+        ).to_json()
+        margins = ratio_history[ratios.PERCENT_RATIOS] * 100
+        view['margins_figure'] = px.line(
+            margins, x=margins.index, y=margins.columns, markers=True,
+            title="Returns, Margins & Yield",
+            labels={'value': 'Percent (%)', 'variable': 'Metric'}
+        ).to_json()
+    return view
+
+
+def ratio_tables(ratio_view, info):
+    """Valuation and profitability tables for a period of the view model
+
+    Latest values come from the ratio history and are dated by the period
+    they were priced at; the live ``info`` is only a fallback.
+    """
+    def latest_value(metric):
+        value, period = ratio_view['latest'].get(metric, (None, None))
+        if value is not None:
+            return value, f"{period:%b %Y}"
+        value = info.get(INFO_RATIO_KEYS[metric])
+        return value, "Current" if value is not None else ""
+
+    def table(metrics):
+        values = [latest_value(m) for m in metrics]
+        return pd.DataFrame({
+            "Metric": metrics,
+            "Value": [format_ratio(m, value) for m, (value, _) in zip(metrics, values)],
+            "As of": [as_of for _, as_of in values],
+        })
+
+    return table(ratios.VALUATION_RATIOS), table(ratios.PROFITABILITY_RATIOS)
+
+
+def live_view(info, name):
+    """Price and overview metrics formatted from the live ``info`` on each rerun"""
+    current_price = info.get('currentPrice') or info.get('regularMarketPrice')
+    return {
+        'price': (
+            f"₹{current_price:,.2f}" if current_price else "N/A",
+            f"{info.get('regularMarketChangePercent', 0):.2f}%" if 'regularMarketChangePercent' in info else None
+        ),
+        'overview': _overview(info, name),
+    }
+
+
+def build_view_model(ticker, stock_data, colors, name):
+    """Materialize everything the ticker page renders from the history and statements"""
+    info = stock_data['info']
+    start_date, end_date = default_range()
+
+    return {
+        'chart_title': f"{info.get('shortName', ticker)} Price Movement",
+        'range': (start_date, end_date),
+        'technical': technical_view(
+            stock_data['hist'], start_date, end_date,
+            f"{info.get('shortName', ticker)} Price Movement", colors
+        ),
+        'statements': {
+            period: {
+                'financials': _statement_table(stock_data[prefix + 'financials']),
+                'cashflow': _statement_table(stock_data[prefix + 'cashflow']),
+            }
+            for period, prefix in PERIODS.items()
+        },
+        'ratios': {period: _ratio_view(stock_data, prefix) for period, prefix in PERIODS.items()},
+    }